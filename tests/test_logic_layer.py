@@ -197,6 +197,162 @@ class TestTemplateObject(unittest.TestCase):
 
         return
 
+    def test_entropy_linear_shapes(self):
+        x = torch.rand(15, 4)
+        for bias in [True, False]:
+            for remove_attention in [True, False]:
+                for n_classes in [1, 3]:
+                    layer = te.nn.EntropyLinear(4, 20, n_classes=n_classes, bias=bias,
+                                                remove_attention=remove_attention)
+                    # 2D inputs are broadcast over classes: (batch, n_classes, out_features)
+                    self.assertEqual(layer(x).shape, (15, n_classes, 20))
+                    self.assertEqual(layer(x.unsqueeze(0)).shape, (15, n_classes, 20))
+                    if n_classes == 1:
+                        # with a single class, 3D inputs keep their leading dimension
+                        self.assertEqual(layer(torch.stack([x, x])).shape, (15, 2, 20))
+                    self.assertEqual(layer.alpha.shape, (n_classes, 4))
+                    self.assertEqual(layer.concept_mask.shape, (n_classes, 4))
+
+        return
+
+    def test_entropy_linear_scores(self):
+        torch.manual_seed(42)
+        x = torch.rand(15, 4)
+        layer = te.nn.EntropyLinear(4, 20, n_classes=3, temperature=0.3)
+        layer(x)
+
+        # reference scores: softmax over concepts, normalized by their max
+        gamma = layer.weight.norm(dim=2, p=1)
+        alpha = torch.exp(gamma / layer.temperature) / torch.sum(torch.exp(gamma / layer.temperature), dim=1, keepdim=True)
+        alpha_norm = alpha / alpha.max(dim=1)[0].unsqueeze(1)
+        self.assertTrue(torch.allclose(layer.alpha, alpha))
+        self.assertTrue(torch.allclose(layer.alpha, torch.softmax(gamma / layer.temperature, dim=1)))
+        self.assertTrue(torch.allclose(layer.alpha_norm, alpha_norm))
+
+        return
+
+    def test_entropy_linear_double(self):
+        torch.manual_seed(42)
+        x = torch.rand(15, 4, dtype=torch.float64)
+        layer = te.nn.EntropyLinear(4, 20, n_classes=3).double()
+        self.assertEqual(layer(x).dtype, torch.float64)
+
+        # awareness scores keep double precision
+        gamma = layer.weight.norm(dim=2, p=1)
+        alpha = torch.softmax(gamma / layer.temperature, dim=1)
+        self.assertEqual(layer.alpha.dtype, torch.float64)
+        self.assertTrue(torch.allclose(layer.alpha, alpha, rtol=1e-12, atol=1e-15))
+
+        return
+
+    def test_entropy_linear_cache_parametrized(self):
+        class Scale(torch.nn.Module):
+            def forward(self, weight):
+                return 2 * weight
+
+        torch.manual_seed(42)
+        x = torch.rand(15, 4)
+        layers = []
+        for _ in range(2):
+            layer = te.nn.EntropyLinear(4, 20, n_classes=3)
+            torch.nn.utils.parametrize.register_parametrization(layer, 'weight', Scale())
+            layers.append(layer.eval())
+        layer, other = layers
+
+        # computed weights are rebuilt on every access, so their scores are never cached
+        with torch.no_grad():
+            layer(x)
+            self.assertIsNone(layer._alpha_cache)
+            layer.load_state_dict(other.state_dict())
+            layer(x)
+            gamma = layer.weight.norm(dim=2, p=1)
+        self.assertTrue(torch.allclose(layer.alpha, torch.softmax(gamma / layer.temperature, dim=1)))
+
+        return
+
+    def test_entropy_linear_legacy_state_dict(self):
+        torch.manual_seed(42)
+        x = torch.rand(15, 4)
+        for out_features in [20, 4]:
+            layer = te.nn.EntropyLinear(4, out_features, n_classes=3)
+
+            # checkpoints saved before version 2 store (n_classes, out_features, in_features) weights
+            state_dict = layer.state_dict()
+            state_dict['weight'] = state_dict['weight'].transpose(1, 2).contiguous()
+            state_dict._metadata[''] = {'version': 1}
+            legacy = te.nn.EntropyLinear(4, out_features, n_classes=3)
+            legacy.load_state_dict(state_dict)
+            self.assertTrue(torch.equal(legacy.weight, layer.weight))
+            self.assertTrue(torch.allclose(legacy(x), layer(x)))
+
+            # current checkpoints are loaded as they are
+            current = te.nn.EntropyLinear(4, out_features, n_classes=3)
+            current.load_state_dict(layer.state_dict())
+            self.assertTrue(torch.equal(current.weight, layer.weight))
+
+        # without metadata, non-square legacy weights are recognized by their shape
+        layer = te.nn.EntropyLinear(4, 20, n_classes=3)
+        state_dict = {k: v for k, v in layer.state_dict().items()}
+        state_dict['weight'] = state_dict['weight'].transpose(1, 2).contiguous()
+        legacy = te.nn.EntropyLinear(4, 20, n_classes=3)
+        legacy.load_state_dict(state_dict)
+        self.assertTrue(torch.equal(legacy.weight, layer.weight))
+
+        return
+
+    def test_entropy_linear_cache(self):
+        torch.manual_seed(42)
+        x = torch.rand(15, 4)
+        layer = te.nn.EntropyLinear(4, 20, n_classes=3)
+        optimizer = torch.optim.SGD(layer.parameters(), lr=1.)
+
+        def reference_alpha():
+            gamma = layer.weight.detach().norm(dim=2, p=1)
+            return torch.softmax(gamma / layer.temperature, dim=1)
+
+        # awareness scores are reused across inference calls
+        layer(x).sum().backward()
+        layer.eval()
+        with torch.no_grad():
+            layer(x)
+            cached_alpha = layer.alpha
+            layer(x)
+        self.assertIs(layer.alpha, cached_alpha)
+
+        # optimizer steps invalidate the cache
+        optimizer.step()
+        with torch.no_grad():
+            layer(x)
+        self.assertIsNot(layer.alpha, cached_alpha)
+        self.assertTrue(torch.allclose(layer.alpha, reference_alpha()))
+
+        # loading new parameters invalidates the cache
+        cached_alpha = layer.alpha
+        layer.load_state_dict(te.nn.EntropyLinear(4, 20, n_classes=3).state_dict())
+        with torch.no_grad():
+            layer(x)
+        self.assertIsNot(layer.alpha, cached_alpha)
+        self.assertTrue(torch.allclose(layer.alpha, reference_alpha()))
+
+        # changing the temperature invalidates the cache
+        cached_alpha = layer.alpha
+        layer.temperature = 0.1
+        with torch.no_grad():
+            layer(x)
+        self.assertIsNot(layer.alpha, cached_alpha)
+        self.assertTrue(torch.allclose(layer.alpha, reference_alpha()))
+
+        # training mode never uses nor keeps the cache
+        cached_alpha = layer.alpha
+        layer.train()
+        with torch.no_grad():
+            layer(x)
+        self.assertIsNot(layer.alpha, cached_alpha)
+        self.assertIsNone(layer._alpha_cache)
+        self.assertTrue(torch.allclose(layer.alpha, reference_alpha()))
+
+        return
+
     # def test_entropy_gnn(self):
     #     x, y = make_classification(n_samples=1000, n_features=20, random_state=42)
     #     sss = StratifiedShuffleSplit(n_splits=5, test_size=0.5, random_state=0)
@@ -91,6 +91,7 @@ def explain_classes(model: torch.nn.Module, c: torch.Tensor, y: torch.Tensor,
     return explanations, local_explanations
 
 
+@torch.no_grad()
 def explain_class(model: torch.nn.Module, c: torch.Tensor, y: torch.Tensor,
                   train_mask: torch.Tensor, val_mask: torch.Tensor, target_class: int, edge_index: torch.Tensor = None,
                   max_minterm_complexity: int = None, topk_explanations: int = 3, max_accuracy: bool = False,
@@ -29,7 +29,7 @@ class ConceptReasoningLayer(torch.nn.Module):
         self.temperature = temperature
 
     def forward(self, x, c, return_attn=False, sign_attn=None, filter_attn=None):
-        values = c.unsqueeze(-1).repeat(1, 1, self.n_classes)
+        values = c.unsqueeze(-1).expand(-1, -1, self.n_classes)
 
         if sign_attn is None:
             # compute attention scores to build logic sentence
@@ -1,13 +1,26 @@
 import math
+from typing import Tuple
 
 import torch
 from torch import Tensor
 from torch import nn
+from torch.nn import functional as F
+
+
+@torch.jit.script
+def _softmax_maxnorm(x: Tensor) -> Tuple[Tensor, Tensor]:
+    # softmax(x) / max(softmax(x)) = exp(x - max(x)), so both scores share the same exponentials
+    x_norm = torch.exp(x - x.amax(dim=1, keepdim=True))
+    return x_norm / x_norm.sum(dim=1, keepdim=True), x_norm
 
 
 class EntropyLinear(nn.Module):
-    """Applies a linear transformation to the incoming data: :math:`y = xA^T + b`
+    """Applies a linear transformation to the incoming data: :math:`y = xA + b`
+
+    The weight :math:`A` is stored with shape ``(n_classes, in_features, out_features)``.
     """
+    # version 2 stores the weight transposed w.r.t. the (n_classes, out_features, in_features) layout
+    _version = 2
 
     def __init__(self, in_features: int, out_features: int, n_classes: int, temperature: float = 0.6,
                  bias: bool = True, remove_attention: bool = False) -> None:
@@ -17,42 +30,89 @@ class EntropyLinear(nn.Module):
         self.n_classes = n_classes
         self.temperature = temperature
         self.alpha = None
+        self._alpha_cache = None
         self.remove_attention = remove_attention
-        self.weight = nn.Parameter(torch.Tensor(n_classes, out_features, in_features))
+        # weights are stored already transposed so that the forward pass uses a contiguous matmul
+        self.weight = nn.Parameter(torch.empty(n_classes, in_features, out_features))
         self.has_bias = bias
         if bias:
-            self.bias = nn.Parameter(torch.Tensor(n_classes, 1, out_features))
+            self.bias = nn.Parameter(torch.empty(n_classes, 1, out_features))
         else:
             self.register_parameter('bias', None)
         self.reset_parameters()
 
     def reset_parameters(self) -> None:
-        nn.init.kaiming_uniform_(self.weight, a=math.sqrt(5))
+        # initialize in the (n_classes, out_features, in_features) layout to keep the same fan-in
+        weight = torch.empty(self.n_classes, self.out_features, self.in_features)
+        nn.init.kaiming_uniform_(weight, a=math.sqrt(5))
+        with torch.no_grad():
+            self.weight.copy_(weight.permute(0, 2, 1))
         if self.bias is not None:
-            fan_in, _ = nn.init._calculate_fan_in_and_fan_out(self.weight)
+            fan_in, _ = nn.init._calculate_fan_in_and_fan_out(weight)
             bound = 1 / math.sqrt(fan_in)
             nn.init.uniform_(self.bias, -bound, bound)
 
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict,
+                              missing_keys, unexpected_keys, error_msgs):
+        version = local_metadata.get('version', None)
+        weight_key = prefix + 'weight'
+        weight = state_dict.get(weight_key, None)
+        if weight is not None and weight.dim() == 3:
+            legacy_shape = (self.n_classes, self.out_features, self.in_features)
+            # without metadata the layout can only be inferred from non-square weights
+            is_legacy = (version is not None and version < 2) or \
+                        (version is None and self.in_features != self.out_features and
+                         tuple(weight.shape) == legacy_shape)
+            if is_legacy:
+                state_dict[weight_key] = weight.transpose(1, 2)
+        super(EntropyLinear, self)._load_from_state_dict(state_dict, prefix, local_metadata, strict,
+                                                         missing_keys, unexpected_keys, error_msgs)
+
+    def _compute_alpha(self) -> Tuple[Tensor, Tensor]:
+        # awareness scores depend on the parameters only, so they are reused across inference calls
+        # as long as the weight is the same parameter, in the same storage (.to() moves) and unmodified
+        # (in-place updates bump the tensor version). Edits through weight.data bypass the version counter
+        # and are not detected. Computed weights (e.g. torch.nn.utils.parametrize) are never cached.
+        weight = self.weight
+        cacheable = not self.training and not torch.is_grad_enabled() and \
+            self._parameters.get('weight', None) is weight
+        cache_key = (weight.data_ptr(), weight._version, self.temperature)
+        if cacheable and self._alpha_cache is not None:
+            cached_weight, cached_key, scores = self._alpha_cache
+            if cached_weight is weight and cached_key == cache_key:
+                return scores
+
+        gamma = weight.norm(dim=2, p=1)
+        # half-precision weights are upcast to float32 for the softmax (float32 and float64 are kept as they are)
+        gamma = gamma.to(torch.promote_types(gamma.dtype, torch.float32))
+        alpha, alpha_norm = _softmax_maxnorm(gamma / self.temperature)
+        alpha, alpha_norm = alpha.to(weight.dtype), alpha_norm.to(weight.dtype)
+
+        self._alpha_cache = (weight, cache_key, (alpha, alpha_norm)) if cacheable else None
+        return alpha, alpha_norm
+
     def forward(self, input: Tensor) -> Tensor:
-        if len(input.shape) == 2:
-            input = input.unsqueeze(0)
         # compute concept-awareness scores
-        gamma = self.weight.norm(dim=1, p=1)
-        self.alpha = torch.exp(gamma/self.temperature) / torch.sum(torch.exp(gamma/self.temperature), dim=1, keepdim=True)
+        self.alpha, self.alpha_norm = self._compute_alpha()
 
         # weight the input concepts by awareness scores
-        self.alpha_norm = self.alpha / self.alpha.max(dim=1)[0].unsqueeze(1)
+        # (both branches broadcast the input against the (n_classes, 1, in_features) scores)
         if self.remove_attention:
             self.concept_mask = torch.ones_like(self.alpha_norm, dtype=torch.bool)
-            x = input
+            x = input.expand(torch.broadcast_shapes(input.shape, (self.n_classes, 1, 1)))
         else:
             self.concept_mask = self.alpha_norm > 0.5
             x = input.multiply(self.alpha_norm.unsqueeze(1))
 
-        # compute linear map
-        x = x.matmul(self.weight.permute(0, 2, 1))
+        # compute linear map (the bias add is fused into the matmul)
+        if self.n_classes == 1:
+            # F.linear keeps any leading dimension of x, as the broadcasting matmul did
+            bias = self.bias[0, 0] if self.has_bias else None
+            return F.linear(x, self.weight[0].t(), bias).permute(1, 0, 2)
         if self.has_bias:
-             x += self.bias
+            x = torch.baddbmm(self.bias, x, self.weight)
+        else:
+            x = torch.bmm(x, self.weight)
         return x.permute(1, 0, 2)
 
     def extra_repr(self) -> str: